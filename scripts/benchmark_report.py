@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from pathlib import Path
+
+import snapshot_report
+
+SCRIPTS_DIR = Path(__file__).parent
+MEASURE_MARGIN = SCRIPTS_DIR / "measure_margin.py"
+GROUPS = ("HTMLBasicTests", "YomitanSnapshotTests")
+MAGICK_STAGES = ("image_metrics", "perceptual_hash", "run_compare", "estimate_shift", "measure_margin")
+
+
+def write_png(path, width, height, rows):
+    # rows: list of bytes objects, RGB, width * 3 bytes each
+    raw = b"".join(b"\x00" + row for row in rows)
+
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    payload = b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b"")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(payload)
+
+
+def synthetic_rows(width, height, rng, shift=0, tint=None):
+    # White page with dark "text line" bars and an occasional colored block,
+    # roughly what a rendered HTML snapshot looks like to the metrics.
+    white = b"\xff\xff\xff"
+    ink = bytes(tint) if tint else b"\x22\x22\x22"
+    rows = [white * width for _ in range(height)]
+    margin = max(2, width // 24)
+    line_height = max(6, height // 18)
+    y = margin + shift
+    while y + line_height < height - margin:
+        bar_width = rng.randint(width // 3, max(width // 3 + 1, width - 2 * margin))
+        x0 = margin + shift
+        x1 = min(width, x0 + bar_width)
+        if x1 > x0:
+            bar = white * x0 + ink * (x1 - x0) + white * (width - x1)
+            for row in range(max(0, y), min(height, y + line_height // 2)):
+                rows[row] = bar
+        y += line_height
+    if height > 4 * line_height and width > 4 * margin:
+        block = b"\x3a\x7b\xd5"
+        top = max(0, height - 3 * line_height + shift)
+        x0 = max(0, width - width // 4 - margin + shift)
+        x1 = min(width, x0 + width // 4)
+        for row in range(top, min(height, top + line_height * 2)):
+            line = bytearray(rows[row])
+            line[x0 * 3:x1 * 3] = block * (x1 - x0)
+            rows[row] = bytes(line)
+    return rows
+
+
+def synthetic_html(size, rng):
+    words = ("lorem", "ipsum", "dolor", "sit", "amet", "ruby", "rt", "日本語", "テキスト")
+    chunks = []
+    total = 0
+    while total < size:
+        text = " ".join(rng.choice(words) for _ in range(8))
+        piece = f"<p style='line-height: 1.4; margin: 4px 0'><b>{text}</b> <i>{text}</i></p>"
+        chunks.append(piece)
+        total += len(piece.encode("utf-8"))
+    return "".join(chunks)
+
+
+def generate_corpus(root, snapshots, width, height, changed_fraction, html_bytes, seed):
+    rng = random.Random(seed)
+    artifacts_dir = root / "artifacts"
+    baseline_dir = root / "baseline"
+    changed_count = int(round(snapshots * changed_fraction))
+    changed = set(rng.sample(range(snapshots), changed_count)) if changed_count else set()
+    for index in range(snapshots):
+        group = GROUPS[index % len(GROUPS)]
+        name = f"synthetic{index:05d}.1.png"
+        page_seed = rng.random()
+        baseline_rows = synthetic_rows(width, height, random.Random(page_seed))
+        if index in changed:
+            variant = index % 2
+            if variant == 0:
+                artifact_rows = synthetic_rows(width, height, random.Random(page_seed), shift=rng.randint(1, 6))
+            else:
+                artifact_rows = synthetic_rows(width, height, random.Random(page_seed), tint=(0x99, 0x99, 0x99))
+        else:
+            artifact_rows = baseline_rows
+        write_png(baseline_dir / group / name, width, height, baseline_rows)
+        write_png(artifacts_dir / group / name, width, height, artifact_rows)
+        if html_bytes:
+            html_payload = synthetic_html(html_bytes, rng)
+            (artifacts_dir / group / name).with_suffix(".html").write_text(html_payload, encoding="utf-8")
+    log_lines = []
+    for index in range(snapshots):
+        status = "failed" if index in changed else "passed"
+        log_lines.append(f"Test Case '-[SwiftUIHTMLExampleTests.HTMLBasicTests testSynthetic{index:05d}]' {status} (0.010 seconds).")
+    test_log = root / "xcodebuild.log"
+    test_log.write_text("\n".join(log_lines) + "\n", encoding="utf-8")
+    return artifacts_dir, baseline_dir, test_log, len(changed)
+
+
+def standin_vision_ocr(image_path):
+    # Linux stand-in for vision_ocr.swift: pay for reading the image, return fixed text.
+    try:
+        data = Path(image_path).read_bytes()
+    except OSError:
+        return None
+    return f"stand-in ocr ({len(data)} bytes)"
+
+
+def standin_render_html_preview(html_payload, out_path, width=600, height=220):
+    # Linux stand-in for render_html.swift: write the same HTML document and a blank PNG.
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    html_path = out_path.with_suffix(".html")
+    payload = (
+        "<!doctype html><html><head><meta charset='utf-8'>"
+        f"<style>{snapshot_report.BASE_CSS}</style></head><body>"
+        f"<div class='snapshot-root'>{html_payload}</div></body></html>"
+    )
+    html_path.write_text(payload, encoding="utf-8")
+    write_png(out_path, width, height, [b"\xff\xff\xff" * width] * height)
+    return True
+
+
+@contextlib.contextmanager
+def standin_tools(enabled):
+    if not enabled:
+        yield
+        return
+    saved = (snapshot_report.run_vision_ocr, snapshot_report.render_html_preview)
+    snapshot_report.run_vision_ocr = standin_vision_ocr
+    snapshot_report.render_html_preview = standin_render_html_preview
+    try:
+        yield
+    finally:
+        snapshot_report.run_vision_ocr, snapshot_report.render_html_preview = saved
+
+
+def timed(fn, items):
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    total = time.perf_counter() - start
+    return {
+        "count": len(items),
+        "total_s": total,
+        "per_item_s": total / len(items) if items else None,
+    }
+
+
+def best_of(repeat, fn, items):
+    runs = [timed(fn, items) for _ in range(repeat)]
+    return min(runs, key=lambda run: run["total_s"])
+
+
+def run_benchmarks(args, root):
+    artifacts_dir, baseline_dir, test_log, changed = generate_corpus(
+        root,
+        args.snapshots,
+        args.width,
+        args.height,
+        args.changed_fraction,
+        args.html_bytes,
+        args.seed,
+    )
+    pairs = []
+    for artifact in sorted(artifacts_dir.rglob("*.png")):
+        group = artifact.parent.relative_to(artifacts_dir).as_posix()
+        pairs.append((baseline_dir / group / artifact.name, artifact))
+    images = [path for pair in pairs for path in pair]
+    diff_dir = root / "diffs"
+    diff_dir.mkdir(parents=True, exist_ok=True)
+
+    stages = {}
+    stages["image_metrics"] = best_of(args.repeat, snapshot_report.image_metrics, images)
+    stages["perceptual_hash"] = best_of(args.repeat, snapshot_report.perceptual_hash, images)
+    stages["run_compare"] = best_of(
+        args.repeat,
+        lambda pair: snapshot_report.run_compare(pair[0], pair[1], diff_dir / f"diff-{pair[1].name}"),
+        pairs,
+    )
+    stages["estimate_shift"] = best_of(args.repeat, lambda pair: snapshot_report.estimate_shift(*pair), pairs)
+    stages["measure_margin"] = best_of(
+        args.repeat,
+        lambda path: subprocess.run(
+            [sys.executable, str(MEASURE_MARGIN), str(path)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=False,
+        ),
+        images,
+    )
+    stages["parse_test_log"] = best_of(args.repeat, snapshot_report.parse_test_log, [str(test_log)])
+
+    def end_to_end(_):
+        out_prefix = root / "report" / "snapshot-report"
+        with standin_tools(not args.native_tools), contextlib.redirect_stdout(io.StringIO()):
+            snapshot_report.build_report(
+                artifacts_dir,
+                baseline_dir,
+                "Synthetic Benchmark Report",
+                str(out_prefix),
+                str(test_log),
+                cluster_distance=args.cluster_distance,
+                bundle=args.bundle,
+            )
+        shutil.rmtree(root / "report", ignore_errors=True)
+
+    stages["build_report"] = best_of(args.repeat, end_to_end, [None])
+    stages["build_report"]["snapshots"] = len(pairs)
+    return changed, stages
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "-C", str(SCRIPTS_DIR), "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (FileNotFoundError, subprocess.CalledProcessError):
+        return None
+
+
+def find_magick():
+    for tool in ("/opt/homebrew/bin/magick", "/opt/homebrew/bin/convert"):
+        if Path(tool).exists():
+            return tool
+    return shutil.which("magick") or shutil.which("convert")
+
+
+def fallback_stages(environment):
+    if not environment.get("magick"):
+        return list(MAGICK_STAGES)
+    if not environment.get("numpy"):
+        return ["estimate_shift"]
+    return []
+
+
+def compare_results(previous_path, current):
+    try:
+        previous = json.loads(Path(previous_path).read_text(encoding="utf-8"))
+    except (OSError, ValueError) as error:
+        print(f"Unable to read {previous_path}: {error}")
+        return False
+    previous_env = previous.get("environment") or {}
+    current_env = current["environment"]
+    mismatched = [tool for tool in ("magick", "numpy") if bool(previous_env.get(tool)) != bool(current_env.get(tool))]
+    if mismatched:
+        print(
+            f"Refusing to compare with {previous_path}: {', '.join(mismatched)} availability differs "
+            "between the runs, so the same stages time different code paths"
+        )
+        return False
+    print(f"Compared with {previous_path} ({previous.get('environment', {}).get('revision') or 'unknown revision'}):")
+    for name, stage in current["stages"].items():
+        old = (previous.get("stages") or {}).get(name)
+        if not old or not old.get("total_s"):
+            print(f"  {name}: {stage['total_s']:.3f}s (no previous result)")
+            continue
+        ratio = stage["total_s"] / old["total_s"]
+        print(f"  {name}: {old['total_s']:.3f}s -> {stage['total_s']:.3f}s ({ratio:.2f}x)")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark snapshot_report.py and measure_margin.py on a synthetic corpus")
+    parser.add_argument("--snapshots", type=int, default=40, help="Number of artifact/baseline pairs to generate")
+    parser.add_argument("--width", type=int, default=390, help="Synthetic image width in pixels")
+    parser.add_argument("--height", type=int, default=240, help="Synthetic image height in pixels")
+    parser.add_argument("--changed-fraction", type=float, default=0.25, help="Fraction of artifacts that differ from baseline")
+    parser.add_argument("--html-bytes", type=int, default=2048, help="Approximate size of each HTML payload")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per stage; the fastest is recorded")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--work-dir", default="", help="Where to generate the corpus (defaults to a temporary directory)")
+    parser.add_argument("--native-tools", action="store_true", help="Use the real Vision/WebKit tools instead of the Linux stand-ins")
+    parser.add_argument("--bundle", action="store_true", help="Benchmark build_report in --bundle mode")
+    parser.add_argument(
+        "--cluster-distance",
+        type=int,
+        default=snapshot_report.DEFAULT_CLUSTER_DISTANCE,
+        help="Perceptual-hash clustering distance passed to build_report (default %(default)s); negative disables clustering",
+    )
+    parser.add_argument(
+        "--allow-missing-tools",
+        action="store_true",
+        help="Run even without ImageMagick; the affected stages then only time the fallback path",
+    )
+    parser.add_argument("--output", default="", help="Write results as JSON to this path")
+    parser.add_argument("--compare", default="", help="Previous JSON results to compare against")
+    args = parser.parse_args()
+    if args.snapshots < 1 or args.width < 1 or args.height < 1:
+        raise SystemExit("--snapshots, --width and --height must be positive")
+    if not 0.0 <= args.changed_fraction <= 1.0:
+        raise SystemExit("--changed-fraction must be between 0 and 1")
+    magick = find_magick()
+    if not magick and not args.allow_missing_tools:
+        raise SystemExit(
+            "ImageMagick not found; most stages would only time the missing-tool fallback. "
+            "Install it or pass --allow-missing-tools."
+        )
+
+    if args.work_dir:
+        root = Path(args.work_dir).resolve()
+        root.mkdir(parents=True, exist_ok=True)
+        changed, stages = run_benchmarks(args, root)
+    else:
+        with tempfile.TemporaryDirectory(prefix="swiftuihtml-report-bench.") as tmp:
+            changed, stages = run_benchmarks(args, Path(tmp))
+
+    results = {
+        "config": {
+            "snapshots": args.snapshots,
+            "width": args.width,
+            "height": args.height,
+            "changed_fraction": args.changed_fraction,
+            "changed": changed,
+            "html_bytes": args.html_bytes,
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "native_tools": args.native_tools,
+            "bundle": args.bundle,
+            "cluster_distance": args.cluster_distance,
+        },
+        "environment": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "magick": magick,
+            "swiftc": shutil.which("swiftc"),
+            "numpy": snapshot_report.np.__version__ if snapshot_report.np else None,
+        },
+        "stages": stages,
+    }
+    results["environment"]["fallback_stages"] = fallback_stages(results["environment"])
+
+    print("Report benchmark summary:")
+    for name, stage in stages.items():
+        per_item = stage["per_item_s"]
+        per_item_str = "n/a" if per_item is None else f"{per_item * 1000:.2f}ms"
+        print(f"  {name}: total={stage['total_s']:.3f}s count={stage['count']} per_item={per_item_str}")
+    if results["environment"]["fallback_stages"]:
+        missing = "ImageMagick" if not magick else "numpy"
+        print(
+            f"  note: {missing} not found; {'/'.join(results['environment']['fallback_stages'])} "
+            "measure the fallback path only"
+        )
+    if args.output:
+        out_path = Path(args.output)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        out_path.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print(out_path)
+    if args.compare and not compare_results(args.compare, results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
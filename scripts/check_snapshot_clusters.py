@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+import argparse
+from pathlib import Path
+
+import snapshot_report
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_DIRS = (
+    REPO_ROOT / "SwiftUIHTMLExampleTests" / "__Snapshots__",
+    REPO_ROOT / "SwiftUIHTMLExampleMacOSTests" / "__Snapshots__",
+)
+
+
+def test_key(name):
+    # testHTMLImageAndNesting-width-lineBreakMode.375-byCharWrapping.png -> testHTMLImageAndNesting;
+    # the iOS and macOS variants of a test count as the same test.
+    method = name.split(".", 1)[0].split("-", 1)[0]
+    return method.removesuffix("MacOS")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Cluster the recorded baselines as if every test passed and fail if unrelated tests share a cluster"
+    )
+    parser.add_argument("dirs", nargs="*", help="Snapshot directories (defaults to the repo's __Snapshots__ folders)")
+    parser.add_argument("--cluster-distance", type=int, default=snapshot_report.DEFAULT_CLUSTER_DISTANCE)
+    args = parser.parse_args()
+
+    roots = [Path(value).resolve() for value in args.dirs] or [path for path in DEFAULT_DIRS if path.exists()]
+    rows = []
+    for root in roots:
+        for path in sorted(root.rglob("*.png")):
+            if not snapshot_report.is_snapshot_image(path.name):
+                continue
+            group = f"{root.parent.name}/{path.parent.relative_to(root).as_posix()}"
+            rows.append((group, path.name, path, path))
+    if not rows:
+        raise SystemExit("No snapshots found")
+
+    hashed = sum(1 for _, _, path, _ in rows if snapshot_report.perceptual_hash(path))
+    if not hashed:
+        raise SystemExit("No perceptual hashes computed (is ImageMagick installed?)")
+    unchanged = {artifact: True for _, _, _, artifact in rows}
+    clusters = snapshot_report.cluster_rows(rows, args.cluster_distance, unchanged)
+
+    unrelated = 0
+    for cluster in clusters:
+        if len(cluster) < 2:
+            continue
+        keys = {test_key(name) for _, name, _, _ in cluster}
+        status = "ok" if len(keys) == 1 else "UNRELATED"
+        if len(keys) > 1:
+            unrelated += 1
+        print(f"{status}: {len(cluster)} snapshots")
+        for group, name, _, _ in cluster:
+            print(f"  {group}/{name}")
+    print(
+        f"{len(rows)} snapshots, {hashed} with a usable hash, {len(clusters)} clusters, "
+        f"{unrelated} mixing unrelated tests (distance {args.cluster_distance})"
+    )
+    if unrelated:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,31 @@
 #!/usr/bin/env python3
+# Requires Python 3.12+ and ImageMagick. Shift detection also needs numpy
+# (`python3 -m pip install numpy`); without it the report says so in its header.
 import argparse
+import hashlib
 import html
 import json
 import os
 import re
+import shutil
 import subprocess
+import sys
 import time
 from pathlib import Path
+from urllib.parse import quote
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HASH_SIZE = 16
+HASH_MIN_BITS = 16
+HASH_TRIM_FUZZ = "2%"
+# Checked against the recorded __Snapshots__ by check_snapshot_clusters.py.
+DEFAULT_CLUSTER_DISTANCE = 48
+SHIFT_FUZZ = 0.02
+PURE_SHIFT_RESIDUAL_RATIO = 0.001
 
 BASE_CSS = (
     "html,body{margin:0;padding:0;font-family:-apple-system,Helvetica,Arial,sans-serif;"
@@ -56,6 +75,101 @@ def run_compare(base_path, new_path, output_path):
     return None
 
 
+def read_gray_image(path, operations=()):
+    candidates = [
+        ("/opt/homebrew/bin/magick", True),
+        ("/opt/homebrew/bin/convert", False),
+        ("magick", True),
+        ("convert", False),
+    ]
+    for tool, uses_magick in candidates:
+        cmd = [tool] + (["convert"] if uses_magick else [])
+        cmd += [str(path), "-alpha", "remove", "-colorspace", "Gray", *operations, "-depth", "8", "pgm:-"]
+        try:
+            data = subprocess.check_output(cmd, stderr=subprocess.DEVNULL)
+        except FileNotFoundError:
+            continue
+        except subprocess.CalledProcessError:
+            continue
+        header = data[:64].split()
+        if len(header) < 4 or header[0] != b"P5":
+            continue
+        try:
+            width = int(header[1])
+            height = int(header[2])
+        except ValueError:
+            continue
+        pixels = data[-width * height:]
+        if len(pixels) != width * height:
+            continue
+        return width, height, pixels
+    return None
+
+
+def estimate_shift(base_path, new_path):
+    # Global translation of the new image relative to the baseline via FFT phase
+    # correlation, plus the pixel difference that remains once it is undone.
+    if np is None:
+        return None
+    base_image = read_gray_image(base_path)
+    new_image = read_gray_image(new_path)
+    if not base_image or not new_image:
+        return None
+    height = max(base_image[1], new_image[1])
+    width = max(base_image[0], new_image[0])
+
+    def ink(image):
+        # Invert so the white page is zero and padding behaves like more page.
+        w, h, pixels = image
+        canvas = np.zeros((height, width), dtype=np.float32)
+        canvas[:h, :w] = 1.0 - np.frombuffer(pixels, dtype=np.uint8).reshape(h, w) / 255.0
+        return canvas
+
+    base = ink(base_image)
+    new = ink(new_image)
+    cross = np.fft.rfft2(new) * np.conj(np.fft.rfft2(base))
+    cross /= np.maximum(np.abs(cross), 1e-9)
+    correlation = np.fft.irfft2(cross, s=(height, width))
+    peak_index = int(np.argmax(correlation))
+    dy, dx = divmod(peak_index, width)
+    if dy > height // 2:
+        dy -= height
+    if dx > width // 2:
+        dx -= width
+
+    pad = ((abs(dy), abs(dy)), (abs(dx), abs(dx)))
+    base_padded = np.pad(base, pad)
+    aligned = np.roll(np.pad(new, pad), (-dy, -dx), axis=(0, 1))
+    before = int(np.count_nonzero(np.abs(base - new) > SHIFT_FUZZ))
+    residual = int(np.count_nonzero(np.abs(base_padded - aligned) > SHIFT_FUZZ))
+    shifted = dx != 0 or dy != 0
+    pure_shift = shifted and residual <= height * width * PURE_SHIFT_RESIDUAL_RATIO and residual < before
+    return {
+        "dx": dx,
+        "dy": dy,
+        "peak": float(correlation.flat[peak_index]),
+        "diff_before": before,
+        "diff_residual": residual,
+        "pure_shift": pure_shift,
+    }
+
+
+def diff_is_empty(metric):
+    # `compare -metric AE` prints the differing pixel count, e.g. "0" or "0 (0)".
+    try:
+        return float(metric.split()[0]) == 0
+    except (IndexError, ValueError):
+        return False
+
+
+def format_shift(shift):
+    label = "pure shift" if shift["pure_shift"] else ("shift + changes" if shift["dx"] or shift["dy"] else "no shift")
+    return (
+        f"{label}: offset dx={shift['dx']:+d} dy={shift['dy']:+d} (peak {shift['peak']:.2f}), "
+        f"diff px {shift['diff_before']} -> {shift['diff_residual']} after alignment"
+    )
+
+
 def run_vision_ocr(image_path):
     script = Path(__file__).parent / "vision_ocr.swift"
     if not script.exists():
@@ -349,6 +463,137 @@ def image_metrics(path):
     return metrics
 
 
+def content_thumbnail(path):
+    # Trim the white page first so sparse text on a tall snapshot still fills the thumbnail.
+    info = run_magick([str(path), "-alpha", "remove", "-fuzz", HASH_TRIM_FUZZ, "-format", "%w %h %@", "info:"])
+    if not info:
+        return None
+    parts = info.split()
+    if len(parts) < 3:
+        return None
+    trim = parse_trim_geometry(parts[2])
+    try:
+        width = int(parts[0])
+        height = int(parts[1])
+    except ValueError:
+        return None
+    if not trim or trim["trim_width"] < 4 or trim["trim_height"] < 4:
+        return None
+    image = read_gray_image(path, [
+        "-fuzz",
+        HASH_TRIM_FUZZ,
+        "-trim",
+        "+repage",
+        "-resize",
+        f"{HASH_SIZE + 1}x{HASH_SIZE}!",
+    ])
+    if not image or image[0] != HASH_SIZE + 1 or image[1] != HASH_SIZE:
+        return None
+    return {
+        "size": (width, height),
+        "pixels": image[2],
+    }
+
+
+def perceptual_hash(path):
+    # Difference hash of the trimmed content: one bit per horizontal neighbour pair.
+    thumbnail = content_thumbnail(path)
+    if not thumbnail:
+        return None
+    pixels = thumbnail["pixels"]
+    stride = HASH_SIZE + 1
+    value = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left = pixels[row * stride + col]
+            right = pixels[row * stride + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    # Near-blank or near-uniform content hashes alike no matter what it shows.
+    bits = value.bit_count()
+    if bits < HASH_MIN_BITS or bits > HASH_SIZE * HASH_SIZE - HASH_MIN_BITS:
+        return None
+    return {"size": thumbnail["size"], "hash": value}
+
+
+def file_digest(path):
+    try:
+        with path.open("rb") as handle:
+            return hashlib.file_digest(handle, "sha256").hexdigest()
+    except OSError:
+        return None
+
+
+def pair_unchanged(baseline, artifact):
+    if not baseline.exists() or not artifact.exists():
+        return False
+    base_digest = file_digest(baseline)
+    return base_digest is not None and base_digest == file_digest(artifact)
+
+
+def snapshot_signature(baseline, artifact):
+    if not baseline.exists() or not artifact.exists():
+        return None
+    base = perceptual_hash(baseline)
+    new = perceptual_hash(artifact)
+    if not base or not new:
+        return None
+    return (base["size"], new["size"]), (base["hash"] << (HASH_SIZE * HASH_SIZE)) | new["hash"]
+
+
+class BKTree:
+    def __init__(self):
+        self.root = None
+
+    def add(self, key, item):
+        if self.root is None:
+            self.root = (key, item, {})
+            return
+        node = self.root
+        while True:
+            distance = (key ^ node[0]).bit_count()
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (key, item, {})
+                return
+            node = child
+
+    def nearest(self, key, max_distance):
+        best = None
+        stack = [self.root] if self.root else []
+        while stack:
+            node_key, item, children = stack.pop()
+            distance = (key ^ node_key).bit_count()
+            if distance <= max_distance and (best is None or distance < best[0]):
+                best = (distance, item)
+            for edge, child in children.items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        return best[1] if best else None
+
+
+def cluster_rows(rows, max_distance, unchanged):
+    # Group baseline/new pairs whose trimmed content hashes alike. Only pairs with
+    # the same image dimensions and the same identical/changed state are compared,
+    # so a regression cannot hide behind a clean run.
+    clusters = []
+    trees = {}
+    for row in rows:
+        _, _, baseline, artifact = row
+        signature = snapshot_signature(baseline, artifact) if max_distance >= 0 else None
+        if signature is None:
+            clusters.append([row])
+            continue
+        sizes, key = signature
+        tree = trees.setdefault((unchanged.get(artifact, False), sizes), BKTree())
+        match = tree.nearest(key, max_distance)
+        if match is not None:
+            clusters[match].append(row)
+            continue
+        tree.add(key, len(clusters))
+        clusters.append([row])
+    return clusters
+
+
 def heuristic_flags(base, new):
     flags = []
     if not base or not new:
@@ -451,6 +696,56 @@ def format_metrics(metrics):
     )
 
 
+def link_or_copy(src, dest):
+    # Prefer a copy-on-write clone: APFS clonefile via BSD `cp -c`, btrfs/xfs
+    # reflink via GNU `cp --reflink`. A hard link shares the inode, so a later
+    # non-atomic rewrite of the snapshot would change the archived report too.
+    clone_flag = "-c" if sys.platform == "darwin" else "--reflink=always"
+    try:
+        result = subprocess.run(
+            ["cp", clone_flag, str(src), str(dest)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=False,
+        )
+        if result.returncode == 0 and dest.exists():
+            return "reflink"
+    except FileNotFoundError:
+        pass
+    dest.unlink(missing_ok=True)
+    try:
+        os.link(src, dest)
+        return "hardlink"
+    except OSError:
+        pass
+    shutil.copy2(src, dest)
+    return "copy"
+
+
+def bundle_image(path, report_dir, bundled, methods):
+    # Returns a link relative to report_dir. Files outside the report are placed
+    # under images/ named by content digest, so identical PNGs are stored once.
+    if path in bundled:
+        return bundled[path]
+    try:
+        relative = path.resolve().relative_to(report_dir.resolve()).as_posix()
+    except ValueError:
+        relative = None
+    if relative is None:
+        digest = file_digest(path)
+        if digest is None:
+            return None
+        images_dir = report_dir / "images"
+        images_dir.mkdir(parents=True, exist_ok=True)
+        dest = images_dir / f"{digest[:20]}{path.suffix.lower()}"
+        if not dest.exists():
+            method = link_or_copy(path, dest)
+            methods[method] = methods.get(method, 0) + 1
+        relative = f"images/{dest.name}"
+    bundled[path] = relative
+    return relative
+
+
 def is_snapshot_image(name: str) -> bool:
     lower = name.lower()
     if lower.startswith(("reference_", "failure_", "difference_", "diff-")):
@@ -464,7 +759,7 @@ def is_snapshot_image(name: str) -> bool:
     return True
 
 
-def build_report(artifacts_dir, baseline_dir, title, out_prefix, test_log=None):
+def build_report(artifacts_dir, baseline_dir, title, out_prefix, test_log=None, cluster_distance=DEFAULT_CLUSTER_DISTANCE, bundle=False):
     if not artifacts_dir.exists():
         raise SystemExit("No artifacts found at " + str(artifacts_dir))
     stamp = time.strftime("%Y%m%d-%H%M%S")
@@ -474,6 +769,14 @@ def build_report(artifacts_dir, baseline_dir, title, out_prefix, test_log=None):
     test_statuses = parse_test_log(test_log)
     test_log_path = Path(test_log) if test_log else None
     test_log_available = bool(test_log_path and test_log_path.exists())
+    bundled = {}
+    bundle_methods = {}
+
+    def image_src(path):
+        if not bundle:
+            return f"file://{path}"
+        relative = bundle_image(path, report_dir, bundled, bundle_methods)
+        return quote(relative) if relative else f"file://{path}"
 
     rows = []
     artifacts = list(artifacts_dir.rglob("*.png"))
@@ -486,6 +789,8 @@ def build_report(artifacts_dir, baseline_dir, title, out_prefix, test_log=None):
         baseline = baseline_dir / group
         baseline = baseline / name
         rows.append((group, name, baseline, artifact))
+    unchanged = {artifact: pair_unchanged(baseline, artifact) for _, _, baseline, artifact in rows}
+    clusters = cluster_rows(rows, cluster_distance, unchanged)
 
     css = """
 body { font-family: -apple-system, Helvetica, Arial, sans-serif; margin: 24px; background: #f7f7f7; }
@@ -515,6 +820,10 @@ img { width: 100%; height: auto; border: 1px solid #eee; background: #fff; borde
 .test-result.passed { color: #2e7d32; }
 .test-result.failed { color: #d32f2f; }
 .test-result.unknown { color: #6c6c6c; }
+.shift { font-size: 11px; color: #666; margin-top: 6px; }
+.shift.pure { color: #b26a00; font-weight: 600; }
+.cluster { margin-top: 12px; padding: 10px; border-radius: 8px; background: #f3f6fb; border: 1px solid #e1e8f5; }
+.cluster-member { margin-top: 8px; }
 """
 
     script = """
@@ -530,11 +839,17 @@ function toggleHtml(id) {
 
     parts = ["<!doctype html>", "<html><head><meta charset='utf-8'>", f"<style>{css}</style>", script, "</head><body>"]
     parts.append(
-        f"<div class='header'><h2>{html.escape(title)}</h2><div>Artifacts: {html.escape(str(artifacts_dir))}</div></div>"
+        f"<div class='header'><h2>{html.escape(title)}</h2><div>Artifacts: {html.escape(str(artifacts_dir))}</div>"
+        f"<div>{len(rows)} snapshots in {len(clusters)} clusters</div></div>"
     )
+    header_end = len(parts)
+    shift_attempts = 0
+    shift_results = 0
 
     current_group = None
-    for group, name, baseline, artifact in rows:
+    for cluster in clusters:
+        group, name, baseline, artifact = cluster[0]
+        members = cluster[1:]
         if group != current_group:
             current_group = group
             parts.append(f"<div class='group'><h3>{html.escape(group)}</h3></div>")
@@ -559,7 +874,7 @@ function toggleHtml(id) {
         parts.append("<div>")
         parts.append("<div class='label'>Baseline</div>")
         if baseline.exists():
-            parts.append(f"<img src='file://{baseline}' />")
+            parts.append(f"<img src='{image_src(baseline)}' />")
             parts.append(f"<div class='path'>{html.escape(str(baseline))}</div>")
             parts.append(f"<div class='metrics'>{html.escape(format_metrics(base_metrics))}</div>")
         else:
@@ -568,7 +883,7 @@ function toggleHtml(id) {
         parts.append("</div>")
         parts.append("<div>")
         parts.append("<div class='label'>New</div>")
-        parts.append(f"<img src='file://{artifact}' />")
+        parts.append(f"<img src='{image_src(artifact)}' />")
         parts.append(f"<div class='path'>{html.escape(str(artifact))}</div>")
         parts.append(f"<div class='metrics'>{html.escape(format_metrics(new_metrics))}</div>")
         if flags:
@@ -586,18 +901,59 @@ function toggleHtml(id) {
         diff_name = f"diff-{group.replace('/', '_')}-{name}"
         diff_path = report_dir / diff_name
         diff_metric = None
+        shift = None
         if baseline.exists():
             diff_metric = run_compare(baseline, artifact, diff_path)
+            # Phase correlation decodes both images at full size; only pay for it
+            # when the compare step found a difference.
+            if (
+                not unchanged.get(artifact)
+                and diff_metric
+                and diff_path.exists()
+                and not diff_is_empty(diff_metric)
+            ):
+                shift_attempts += 1
+                shift = estimate_shift(baseline, artifact) if np is not None else None
+                if shift:
+                    shift_results += 1
         if diff_path.exists():
-            parts.append(f"<img src='file://{diff_path}' />")
+            parts.append(f"<img src='{image_src(diff_path)}' />")
             if diff_metric:
                 parts.append(f"<div class='metrics'>diff AE={html.escape(diff_metric)}</div>")
+            if shift:
+                shift_class = "shift pure" if shift["pure_shift"] else "shift"
+                parts.append(f"<div class='{shift_class}'>{html.escape(format_shift(shift))}</div>")
         else:
             parts.append("<div class='missing'>Diff unavailable</div>")
         parts.append("</div>")
 
         parts.append("</div>")  # grid
 
+        if members:
+            parts.append("<div class='cluster'>")
+            parts.append(
+                f"<div class='label'>{len(members)} near-duplicate snapshot(s) share this card; analysis above ran once for the cluster</div>"
+            )
+            for member_group, member_name, _, member_artifact in members:
+                member_id = member_artifact.stem.split(".", 1)[0]
+                member_status = test_statuses.get(member_id.split("-", 1)[0])
+                parts.append("<div class='cluster-member'>")
+                if member_group != group:
+                    parts.append(f"<div class='label'>From group {html.escape(member_group)}</div>")
+                parts.append(
+                    f"<div class='path'>{html.escape(member_group)}/{html.escape(member_name)}: "
+                    f"<a href='{image_src(member_artifact)}'>{html.escape(str(member_artifact))}</a></div>"
+                )
+                if member_status and member_status != test_status:
+                    parts.append(
+                        f"<div class='test-result failed'>Test result ({html.escape(member_id)}): "
+                        f"{html.escape(member_status.capitalize())}, differs from this card's test</div>"
+                    )
+                elif member_status:
+                    parts.append(f"<div class='metrics'>Test result: {html.escape(member_status.capitalize())}</div>")
+                parts.append("</div>")
+            parts.append("</div>")
+
         html_path = artifact.with_suffix(".html")
         if not html_path.exists():
             html_path = baseline.with_suffix(".html")
@@ -638,7 +994,7 @@ function toggleHtml(id) {
         if render_html_preview(html_payload, render_path):
             parts.append("<div class='details-column html-render'>")
             parts.append("<div class='label'>Rendered Snapshot</div>")
-            parts.append(f"<img src='file://{render_path}' />")
+            parts.append(f"<img src='{image_src(render_path)}' />")
             parts.append("</div>")
             ocr_payloads.append(("html", run_vision_ocr(render_path)))
 
@@ -659,8 +1015,20 @@ function toggleHtml(id) {
 
     parts.append("</body></html>")
 
+    shift_warning = None
+    if np is None:
+        shift_warning = "shift detection unavailable: numpy not installed (python3 -m pip install numpy)"
+    elif shift_attempts and not shift_results:
+        shift_warning = "shift detection unavailable: ImageMagick could not decode the images"
+    if shift_warning:
+        parts.insert(header_end, f"<div class='flag'>{html.escape(shift_warning)}</div>")
+        print(f"warning: {shift_warning}", file=sys.stderr)
+
     report_path = report_dir / "index.html"
     report_path.write_text("\n".join(parts), encoding="utf-8")
+    if bundle_methods:
+        summary = ", ".join(f"{count} {method}" for method, count in sorted(bundle_methods.items()))
+        print(f"Bundled images: {summary}")
     print(report_path)
 
 
@@ -671,11 +1039,25 @@ def main():
     parser.add_argument("--title", required=True)
     parser.add_argument("--out-prefix", required=True)
     parser.add_argument("--test-log", default="", help="Optional xcodebuild log used to summarize test results")
+    parser.add_argument(
+        "--cluster-distance",
+        type=int,
+        default=DEFAULT_CLUSTER_DISTANCE,
+        help=(
+            "Max perceptual-hash distance (bits over the 512-bit baseline + new key) for near-duplicate snapshots "
+            "to share a card (default %(default)s); negative disables clustering"
+        ),
+    )
+    parser.add_argument(
+        "--bundle",
+        action="store_true",
+        help="Place referenced images in the report directory (reflink, then hard link, then copy) and link them relatively",
+    )
     args = parser.parse_args()
 
     artifacts_dir = Path(args.artifacts).resolve()
     baseline_dir = Path(args.baseline).resolve()
-    build_report(artifacts_dir, baseline_dir, args.title, args.out_prefix, args.test_log)
+    build_report(artifacts_dir, baseline_dir, args.title, args.out_prefix, args.test_log, args.cluster_distance, args.bundle)
 
 
 if __name__ == "__main__":